@@ -6,8 +6,8 @@
 # Third-party modules
 import contextlib
 import os
-import re
 import pathlib
+import shutil
 import logging
 import numpy as np
 from Bio.SubsMat import MatrixInfo
@@ -18,11 +18,41 @@ import modeller as m
 import modeller.automodel as am
 from modeller.automodel import assess
 
+# Local modules
+from src.residue import AMINO_ACIDS, encode_residues
+
 logging.basicConfig(filename="log/run_warnings.log", level=logging.WARNING)
 logging.captureWarnings(True)
 
+# MODELLER environment of the current process, created once by get_modeller_env
+MODELLER_ENV = None
+
+# One letter codes of the blosum62 matrix: the 20 standard amino acids, B (N or D),
+# Z (Q or E), X (any) and * (stop)
+BLOSUM_ALPHABET = AMINO_ACIDS + "BZX*"
+
+
+def get_blosum62_table():
+    """
+        Builds the symmetric blosum62 substitution matrix as a numpy table indexed by the
+        positions of the two residues in BLOSUM_ALPHABET. Biopython only stores one of the
+        (res_1, res_2) and (res_2, res_1) keys, so both cells are filled from it.
 
-def process(dist_range, dope_dict, output_path, index_list, top_couplings_dict, ali):
+        Returns:
+            Numpy array: (24, 24) table of the blosum62 substitution scores.
+    """
+    table = np.zeros((len(BLOSUM_ALPHABET), len(BLOSUM_ALPHABET)), dtype=int)
+    for (res_1, res_2), value in MatrixInfo.blosum62.items():
+        table[BLOSUM_ALPHABET.index(res_1), BLOSUM_ALPHABET.index(res_2)] = value
+        table[BLOSUM_ALPHABET.index(res_2), BLOSUM_ALPHABET.index(res_1)] = value
+    return table
+
+
+# Table of the blosum62 substitution scores, built once
+BLOSUM62_TABLE = get_blosum62_table()
+
+
+def process(dist_range, dope_table, output_path, index_list, top_couplings_dict, ali):
     """
         Generates the threading, modeller, secondary structure, solvent accessibility and
         co-evolution scores for a given Alignment.
@@ -30,8 +60,8 @@ def process(dist_range, dope_dict, output_path, index_list, top_couplings_dict,
         Args:
             dist_range (int list): List of two values representing the range of distances between
                                    two CA atoms to take into account for the threading algorithm.
-            dope_dict (dict): Dictionnary structure storing the DOPE energy values according to
-                              residues distances.
+            dope_table (Numpy array): (20, 20, 30) array storing the DOPE energy values
+                                      according to residues and distances.
             output_path (str): The path to the results directory.
             index_list (list): A list of gapless position indexes
             top_couplings_dict (dict): A dictionary with key = ranking of ccmpred top couple based
@@ -44,7 +74,7 @@ def process(dist_range, dope_dict, output_path, index_list, top_couplings_dict,
 
     """
     # Calculate the threading score of all alignments and find the initial templates
-    threading_score = ali.calculate_threading_score(dist_range, dope_dict)
+    threading_score = ali.calculate_threading_score(dist_range, dope_table)
     # Calculate the modeller score of all alignments
     modeller_score = ali.calculate_modeller_score(output_path)
     # Calculate secondary structure score
@@ -57,32 +87,77 @@ def process(dist_range, dope_dict, output_path, index_list, top_couplings_dict,
         ccmpred_score, ali.template.name, ali.template.benchmark
 
 
+def get_modeller_env(atom_files_directory):
+    """
+        Get the MODELLER environment of the current process. It is created on the first call
+        only and then reused for all the alignments processed by this process, instead of
+        paying the initialization of a new environment for each model.
+
+        Args:
+            atom_files_directory (str): Path to the directory of the input atom files.
+
+        Returns:
+            modeller.environ: The MODELLER environment.
+    """
+    global MODELLER_ENV
+    if MODELLER_ENV is None:
+        MODELLER_ENV = m.environ()
+    # directories for input atom files
+    MODELLER_ENV.io.atom_files_directory = [atom_files_directory]
+    return MODELLER_ENV
+
+
 def clean_modeller_outputs(modeller_out_dir):
     """
-    Removes all the useless files generated by MODELLER.
+    Removes all the useless files generated by MODELLER: every file of the directory
+    except the hidden ones, and the scratch directories of the workers. The alignments
+    directory is kept.
 
     Args:
-        dir (str): Path to directory to clean.
-        pattern (str): Regex expression for files to remove.
+        modeller_out_dir (str): Path to directory to clean.
     """
-    pattern = "^[^\\.|alignments].*$"
-    for file in os.listdir(modeller_out_dir):
-        if re.search(pattern, file):
-            os.remove(os.path.join(modeller_out_dir, file))
+    # os.scandir yields directory entries which already carry their full path and type
+    with os.scandir(modeller_out_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                if entry.name.startswith("worker_"):
+                    shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
 
-def keep_accessible_residues(dssp_rsa, threshold):
+
+def pairwise_distances(coords):
     """
-     From the output of DSSP we keep only accessible residues which have an RSA
-     value > threshold (arbitrary threshold).
+        Calculates the distances between all pairs of points at once, using the Gram matrix
+        (dot products of all pairs of coordinates) and the identity:
+
+        .. math::
 
-     Args:
-         dssp_rsa (dict): A dictionary as keys = residue index and value = RSA.
-         threshold (int): Relative solvant accessibility threshold.
+           ||a-b||^2 = a.a + b.b - 2a.b
 
-     Returns:
-         dict(dict): Keys are the residue ids and as value their solvant accessible area.
+        This is a single matrix product instead of a python loop over all pairs of points.
+
+        Args:
+            coords (Numpy array): (N, 3) coordinates, with rows of NaN for missing points.
+
+        Returns:
+            Numpy array: (N, N) matrix of distances, NaN for the missing points.
     """
-    return {key: val for key, val in dssp_rsa.items() if val > threshold}
+    # Centering the coordinates does not change the distances but limits the rounding
+    # errors of the identity
+    coords = coords - np.nanmean(coords, axis=0)
+    gram = coords @ coords.T
+    # The squared norms are copied out of the diagonal since the Gram matrix is then
+    # turned in place into the squared distances, without any other (N, N) temporary
+    sq_norms = np.einsum('ii->i', gram).copy()
+    dist_sq = gram
+    dist_sq *= -2
+    dist_sq += sq_norms[:, None]
+    dist_sq += sq_norms[None, :]
+    np.maximum(dist_sq, 0, out=dist_sq)
+    return np.sqrt(dist_sq, out=dist_sq)
 
 
 class Alignment:
@@ -106,68 +181,54 @@ class Alignment:
         self.query = query
         self.template = template
 
-    def calculate_threading_score(self, dist_range, dope_dict):
+    def calculate_threading_score(self, dist_range, dope_table):
         """
             Calculate the threading score of the query on the template sequence.
             1) For each pair residues of the query sequence the distance between them is
-            calculated using the coordinates of the template sequence.The distance calculation
-            is optimized.
-            2) The calculated distance is then convert into a dope energy value.
-            3) All elements of the energy matrix generated are finally sum and returned as the
-            opposite (multiplied by -1) since it is an energy score. This is to simplify the
-            min/max normalization afterwards.
+            calculated using the coordinates of the template sequence. All the distances are
+            calculated at once with numpy.
+            2) The calculated distances are then converted into dope energy values, gathered
+            from the (20, 20, 30) table of the dope energies.
+            3) All the energies are finally sum and returned as the opposite (multiplied by -1)
+            since it is an energy score. This is to simplify the min/max normalization
+            afterwards.
+
+            Only pairs of residues which are at least 2 positions apart, not facing a gap in the
+            query or the template, and within dist_range are taken into account.
 
             Args:
                 dist_range (list of int): Range of distances in angstroms. Distances
                                           within this range only are taken into account.
-                dope_dict (dict): A dictionary with key = res_1-res_2 and
-                                        value = an array of 30 dope energy values.
+                dope_table (Numpy array): A (20, 20, 30) array of the dope energy values
+                                          indexed by the codes of the two residues and
+                                          the distance interval.
 
             Returns:
                 sum of energy matrix(float): Threading score calculated.
         """
-        gap_penalty = 0
-        query = self.query.residues
-        template = self.template.residues
-
         query_size = self.query.get_size()
-        # This sets a numpy matrix of shape query * query which will contain all
-        # the energies corresponding to distances between all pairs of residues
-        # between the query and itself: the coordinates are the ones from the template.
-        energy = np.empty((query_size, query_size), dtype=object)
-        # Filling the matrix afterwards with "NaN" is faster
-        energy.fill(np.nan)
-        for i, row_res in enumerate(query):
-            # The gap was already treated
-            if i <= (query_size - 3) and energy[i, (i + 2)] == gap_penalty:
-                continue
-            # There is a gap in the query or the template
-            elif row_res.name == "-" or template[i].name == "-":
-                # The whole line is set with gap penalty value
-                energy[i, (i + 2):] = gap_penalty
-                continue
-            for j in range(i + 2, query_size - 1):
-                col_res = query[j]
-                # The gap was already treated
-                if energy[i, j] == gap_penalty:
-                    continue
-                # There is a gap in the query or the template
-                elif col_res.name == "-" or template[j].name == "-":
-                    # The whole column is set with gap penalty value
-                    energy[:(j - 1), j] = gap_penalty
-                    continue
-                else:
-                    # Calculate to distance between two residues
-                    dist = template[i].calculate_distance(template[j], "CA")
-                    # Keep distances only in a defined range because we don't want to
-                    # take into account directly bonded residues (dist < ~5 A) and too far residues
-                    if dist_range[0] <= dist <= dist_range[1]:
-                        # DOPE energy values spread between 0.25 and 15 by 0.5 intervals
-                        # So 30 intervals and max value = 15
-                        interval_index = round(int((dist * 30) / 15))
-                        energy[i, j] = dope_dict[row_res.name + col_res.name][interval_index]
-        # Return the sum of energy matrix with numpy's "Nan" interpreted as zeros
-        return np.nansum(energy) * (-1)
+        query_codes = encode_residues(self.query.residues)
+        # The gaps of the template have NaN CA coordinates
+        distances = pairwise_distances(self.template.ca_coords)
+        # Pairs of residues which are at least 2 positions apart (upper triangle), as two
+        # flat arrays of indexes: the masks below are then applied on the pairs only,
+        # instead of on whole (N, N) matrices
+        rows, cols = np.triu_indices(query_size, 2)
+        # The gaps of the query are removed here, those of the template have NaN distances
+        kept = (query_codes[rows] >= 0) & (query_codes[cols] >= 0)
+        rows, cols = rows[kept], cols[kept]
+        pair_distances = distances[rows, cols]
+        # Keep distances only in a defined range because we don't want to
+        # take into account directly bonded residues (dist < ~5 A) and too far residues
+        with np.errstate(invalid="ignore"):
+            kept = (pair_distances >= dist_range[0]) & (pair_distances <= dist_range[1])
+        rows, cols, pair_distances = rows[kept], cols[kept], pair_distances[kept]
+        # DOPE energy values spread between 0.25 and 15 by 0.5 intervals
+        # So 30 intervals and max value = 15
+        interval_index = np.minimum((pair_distances * 30 / 15).astype(int),
+                                    dope_table.shape[2] - 1)
+        energy = dope_table[query_codes[rows], query_codes[cols], interval_index]
+        return np.sum(energy) * (-1)
 
     def calculate_ss_score(self):
         """
@@ -186,101 +247,82 @@ class Alignment:
 
             With N = length of the gapless query and total_incorrect = all the incorrectly predicted
             secondary structures with a confidence score < 7 (True negatives).
-            The template used is the one generated by Modeller.
+            The predictions of the query are compared to the secondary structures of the template
+            at each position of the alignment where none of them is a gap.
 
             Returns:
                 secondary structure score(float): the proportion of well predicted secondary
                 structure predictions.
         """
-        total_incorrect = 0
         score = 0
-        query_ind = 0
-        templ_ind = 0
-        ind = 0
-        query_len = self.query.get_size()
-        while ind < query_len:
-            # Skip gaps in secondary structure predictions
-            while query_ind < query_len and self.query.residues[query_ind].secondary_struct == "-":
-                query_ind += 1
-            while (templ_ind < query_len\
-                    and self.template.residues[templ_ind].secondary_struct == "-"):
-                templ_ind += 1
-            # Count incorrect secondary structure predictions of query according to the template
-            if (query_ind < query_len and templ_ind < query_len\
-                and self.query.residues[query_ind].ss_confidence < 7\
-                    and self.query.residues[query_ind].secondary_struct\
-                    != self.template.residues[templ_ind].secondary_struct):
-                total_incorrect += 1
-            ind += 1
-            query_ind += 1
-            templ_ind += 1
+        query_ss = np.array([res.secondary_struct for res in self.query.residues])
+        template_ss = np.array([res.secondary_struct for res in self.template.residues])
+        query_conf = np.array([-1 if res.ss_confidence == "-" else res.ss_confidence
+                               for res in self.query.residues])
+        # Skip gaps in secondary structure predictions
+        aligned = (query_ss != "-") & (template_ss != "-")
+        # Count incorrect secondary structure predictions of query according to the template
+        total_incorrect = np.count_nonzero(aligned & (query_conf < 7) & (query_ss != template_ss))
         try:
             # Calculate Q3
-            gapless_query_len = len([res for res in self.query.residues if res.name != "-"])
-            score = (gapless_query_len - total_incorrect) / gapless_query_len
+            score = (self.query.gapless_len - total_incorrect) / self.query.gapless_len
         except ZeroDivisionError as err:
             print(str(err), "\n\nError ss_score: the query seems to be of size null")
         return score
 
-    def calculate_distance_matrix(self, size):
+    def get_query_coords(self, size, carbon):
         """
-            Calculate the matrix of distances between the all residues (beta-carbon or alpha-carbon
-            otherwise) of the query sequence. Using the coordinates of the template sequence.
-            The distance calculation is optimized.
+            Get the coordinates of the template's atoms aligned on each residue of the query
+            sequence.
 
             Args:
                 size (int): Real size of the query sequence.
+                carbon (str): Type of the carbon ("CA" or "CB").
 
             Returns:
-                2D numpy matrix: The distance matrix between pairs of residue of the query sequence.
+                Numpy array: (size, 3) coordinates, NaN for the residues of the query which are
+                not aligned on a residue of the template.
         """
-        query_size = self.query.get_size()
-        distance = np.empty((size, size), dtype=object)
-        # We fill the matrix with "x" when the alignment between the query and the template is not
-        # starting by the first residue of the query sequence
-        pos = 0
-        while pos < self.query.first-1:
-            distance[pos, (pos+1):] = "x"
-            pos += 1
-
-        index_i = 0
-        for dist_i in range(pos, self.query.last):
-            # Until there is a gap in the aligned query, we pass to the next index
-            while index_i < query_size and self.query.residues[index_i].name == "-":
-                index_i += 1
-            # If there is a gap in the aligned template, we put an "x" and pass to the next index
-            if index_i < query_size and self.template.residues[index_i].name == "-":
-                distance[dist_i, (dist_i+1):] = "x"
-                index_i += 1
-                continue
-            index_j = index_i + 1
-            for dist_j in range(dist_i+1, self.query.last):
-                # Until there is a gap in the aligned query, we pass to the next index
-                while index_j < query_size and self.query.residues[index_j].name == "-":
-                    index_j += 1
-                #If there is a gap in the aligned template, we put an "x" and pass to the next index
-                if index_j < query_size and self.template.residues[index_j].name == "-":
-                    distance[dist_j, (dist_j+1):] = "x"
-                    index_j += 1
-                    continue
-                if distance[dist_i, dist_j] != "x":
-                    # Distance between beta-carbon (alpha-carbon otherwise) is calculated
-                    if self.template.residues[index_i].cb_atom.coords != None\
-                            and self.template.residues[index_j].cb_atom.coords != None:
-                        distance[dist_i, dist_j] = self.template.residues[index_i]\
-                            .calculate_distance(self.template.residues[index_j], "CB")
-                    else:
-                        distance[dist_i, dist_j] = self.template.residues[index_i]\
-                            .calculate_distance(self.template.residues[index_j], "CA")
-                index_j += 1
-            index_i += 1
-        pos = dist_i
-        # As previously, we fill the matrix with "x" when the alignment between the query and
-        # the template is not ending by the last residue of the query sequence
-        while pos < size-1:
-            distance[:pos, (pos+1):] = "x"
-            pos += 1
-        return distance
+        if carbon == "CA":
+            template_coords = self.template.ca_coords
+        elif carbon == "CB":
+            template_coords = self.template.cb_coords
+        # Indexes in the alignment of the residues of the query (the gaps are skipped)
+        aligned_ind = self.query.gapless_indexes
+        # Positions of these residues in the whole query sequence: the alignment does not
+        # necessarily start at the first residue of the query
+        positions = np.arange(len(aligned_ind)) + self.query.first - 1
+        kept = positions < min(self.query.last, size)
+        coords = np.full((size, 3), np.nan, dtype=np.float32)
+        coords[positions[kept]] = template_coords[aligned_ind[kept]]
+        return coords
+
+    def calculate_couplings_distances(self, size, couplings):
+        """
+            Calculate only the distances between the pairs of residues (beta-carbon or
+            alpha-carbon otherwise) of the query sequence given by the couplings, using the
+            coordinates of the template sequence, instead of the whole distance matrix.
+
+            Args:
+                size (int): Real size of the query sequence.
+                couplings (Numpy array): (k, 2) indexes of the pairs of residues.
+
+            Returns:
+                Numpy array: The k distances. NaN when one of the residues is not aligned on a
+                residue of the template.
+        """
+        ca_coords = self.get_query_coords(size, "CA")
+        diff = ca_coords[couplings[:, 0]] - ca_coords[couplings[:, 1]]
+        # Row-wise dot products of the differences: a single pass without the generic
+        # norm machinery of np.linalg.norm
+        distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        # Distance between beta-carbons is used instead when both residues have one
+        if not np.isnan(self.template.cb_coords).all():
+            cb_coords = self.get_query_coords(size, "CB")
+            diff = cb_coords[couplings[:, 0]] - cb_coords[couplings[:, 1]]
+            cb_distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            distances = np.where(np.isnan(cb_distances), distances, cb_distances)
+        return distances
 
     def calculate_coevolution_score(self, index_list, top_couplings_dict):
         """
@@ -288,23 +330,20 @@ class Alignment:
             distances.
 
             Args:
+                index_list (list): A list of gapless position indexes
                 top_couplings_dict(dict): top ranking couplings indexes in the query
-                distance_matrix(float): distance matrix of the query against itself
             Returns:
                 contact_score(float):log10(1+ number of true contacts between ccmpred/distance
                 matrix).
         """
-        distance_matrix = self.calculate_distance_matrix(len(index_list))
-        true_pos = 0
-        for top_position in top_couplings_dict.values():
-            #as matrix is triange, get matrix [i,j]
-            dist = distance_matrix[top_position[0], top_position[1]]
-            dist_inv = distance_matrix[top_position[1], top_position[0]]
-            if (isinstance(dist, float) and dist < 8)\
-            or (isinstance(dist_inv, float) and dist_inv < 8):
-                true_pos += 1
-
-        # Spread of the values
+        couplings = np.array(list(top_couplings_dict.values()), dtype=int).reshape(-1, 2)
+        # Only the distances of the top couplings are needed, not the whole distance matrix
+        distances = self.calculate_couplings_distances(len(index_list), couplings)
+        # NaN distances are never < 8
+        with np.errstate(invalid="ignore"):
+            true_pos = np.count_nonzero(distances < 8)
+
+        # Spread of the values
         contact_score = np.log10(1+true_pos*(self.query.last - self.query.first))
         return contact_score
 
@@ -328,19 +367,25 @@ class Alignment:
          dssp_template_model = DSSP(template_model, template_pdb, dssp="bin/dssp-2.0.4-linux-amd64")
          # Parse the DSSP output to retrieve the relative % of solvant accessible area for each CA.
          #get alignement index
-         query_index_ali = [index for index, residue in enumerate(self.query.residues) if str(residue) != "-"]
-         template_index_ali = [index for index, residue in enumerate(self.template.residues) if str(residue) != "-"]
-         #attribuate alignemnt index
-         rsa_pred_model = dict(zip(query_index_ali, [dssp_pred_model[key][3]
-             for key in dssp_pred_model.keys()]))
-         rsa_template_model = dict(zip(template_index_ali, [dssp_template_model[key][3]
-            for key in dssp_template_model.keys()]))
-         # Keep only residues under a relative accessibilities threshold: buried residues
-         pred_access_residues = keep_accessible_residues(rsa_pred_model, threshold)
-         template_access_residues = keep_accessible_residues(rsa_template_model, threshold)
-
-         # Get the common buried residues
-         common_residues_len = len(set(pred_access_residues).intersection(template_access_residues))
+         query_index_ali = self.query.gapless_indexes
+         template_index_ali = self.template.gapless_indexes
+         rsa_pred_model = np.fromiter((dssp_pred_model[key][3] for key in dssp_pred_model.keys()),
+                                      dtype=float)
+         rsa_template_model = np.fromiter((dssp_template_model[key][3]
+                                           for key in dssp_template_model.keys()), dtype=float)
+         #attribuate alignemnt index: the alignment indexes and the DSSP values are paired
+         #up to the shortest of the two
+         pred_len = min(len(query_index_ali), len(rsa_pred_model))
+         template_len = min(len(template_index_ali), len(rsa_template_model))
+         # Keep only the alignment indexes of the residues over the relative accessibility
+         # threshold
+         pred_access_residues = query_index_ali[:pred_len][rsa_pred_model[:pred_len] > threshold]
+         template_access_residues = template_index_ali[:template_len][
+             rsa_template_model[:template_len] > threshold]
+
+         # Get the common residues
+         common_residues_len = np.intersect1d(pred_access_residues, template_access_residues,
+                                              assume_unique=True).size
          # Normalization
          return common_residues_len/len(query_index_ali)
 
@@ -365,11 +410,10 @@ class Alignment:
 
         """
         with open(ali_path + self.template.name+".ali", "w") as ali_out:
-            template_len = len([res for res in self.template.residues if res.name != '-'])
             ali_out.write(">P1;" + self.template.reindexed_pdb)
             ali_out.write("\nstructure:" + self.template.reindexed_pdb
                           + ":" + str(self.template.first) + ":@:"
-                          + str(template_len)
+                          + str(self.template.gapless_len)
                           + ":@::::\n")
             ali_out.write(self.template.display() + "*")
             ali_out.write("\n>P1;query_" + self.template.name)
@@ -395,56 +439,63 @@ class Alignment:
                 score(float): The DOPE score (multiplied by -1) of the model generated by MODELLER.
         """
         root_dir = os.getcwd()
-        modeller_out_dir = res_path + "/modeller/"
-        ali_dir = "alignments/"
-        pathlib.Path(modeller_out_dir + ali_dir).mkdir(parents=True, exist_ok=True)
+        modeller_out_dir = os.path.abspath(res_path + "/modeller")
+        # The alignments of all the workers are written in the same directory
+        ali_dir = modeller_out_dir + "/alignments/"
         # MODELLER generates the result files in his current directory, so we must
-        # go to the results directory and come back to root dir afterwards.
-        os.chdir(modeller_out_dir)
-        path_to_atm = root_dir + "/data/templates/" + self.template.name
-        # We reindex all the PDB files to avoid any problem with modeller
-        self.template.reindex_pdb(1, path_to_atm, True)
-        # Parse the new PDB to get new residues and their coordinates generated by MODELLER
-        self.template.parse_pdb(path_to_atm + "/" + self.template.reindexed_pdb + ".atm")
-        # Write Modeller's alignment PIR file
-        self.write_alignment_for_modeller("./alignments/")
-        # Redirect Modeller's verbose into nothingness, nil, chaos and abysses !
-        with contextlib.redirect_stdout(None):
-            # create a new MODELLER environment to build this model in
-            m.env = m.environ()
-            # directories for input atom files
-            m.env.io.atom_files_directory = [path_to_atm]
-            a_model = am.automodel(m.env,
-                                   # alignment filename
-                                   alnfile=ali_dir + self.template.name + '.ali',
-                                   # codes of the templates
-                                   knowns=self.template.reindexed_pdb,
-                                   # code of the target
-                                   sequence='query_' + self.template.name,
-                                   # DOPEHR is very similar to DOPEHR but is obtained at
-                                   # Higher Resolution (using a bin size of 0.125Å
-                                   # rather than 0.5Å).
-                                   assess_methods=assess.DOPEHR)
-            a_model.very_fast()
-            # index of the first and last model (determines how many models to calculate)
-            a_model.starting_model = 1
-            a_model.ending_model = 1
-            modeller_dope_score = 0
-            # Catch any errors that Modeller can raise and write them in the log file
-            try:
-                a_model.make()
-            except m.ModellerError as err:
-                logging.warning("Modeller error with " + self.template.name + " | "
-                                + self.template.pdb, str(err))
-        new_model_pdb = a_model.outputs[0]["name"]
-        modeller_dope_score = a_model.outputs[0]["DOPE-HR score"]
-        self.template.modeller_pdb = self.template.pdb + "_mod"
-        # Move the new model to the PDB directory and rename it
-        os.rename(new_model_pdb, path_to_atm + "/" + self.template.modeller_pdb + ".atm")
-        # Parse the new model generated by MODELLER to get the residues and their coordinates
-        self.template.parse_pdb(path_to_atm + "/" + self.template.modeller_pdb + ".atm")
-        # Go back to root directory
-        os.chdir(root_dir)
+        # go to a scratch directory of our own (several alignments are modelled at the
+        # same time by the worker processes) and come back to root dir afterwards.
+        worker_dir = modeller_out_dir + "/worker_" + str(os.getpid())
+        pathlib.Path(ali_dir).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(worker_dir).mkdir(parents=True, exist_ok=True)
+        os.chdir(worker_dir)
+        # The root directory is restored even if MODELLER or the parsing fails, so that
+        # the next alignment processed by this worker starts from the right place.
+        try:
+            path_to_atm = root_dir + "/data/templates/" + self.template.name
+            # We reindex all the PDB files to avoid any problem with modeller
+            self.template.reindex_pdb(1, path_to_atm, True)
+            # Parse the new PDB to get new residues and their coordinates generated by MODELLER
+            self.template.parse_pdb(path_to_atm + "/" + self.template.reindexed_pdb + ".atm")
+            # Write Modeller's alignment PIR file
+            self.write_alignment_for_modeller(ali_dir)
+            # Redirect Modeller's verbose into nothingness, nil, chaos and abysses !
+            with contextlib.redirect_stdout(None):
+                # MODELLER environment to build this model in
+                env = get_modeller_env(path_to_atm)
+                a_model = am.automodel(env,
+                                       # alignment filename
+                                       alnfile=ali_dir + self.template.name + '.ali',
+                                       # codes of the templates
+                                       knowns=self.template.reindexed_pdb,
+                                       # code of the target
+                                       sequence='query_' + self.template.name,
+                                       # DOPEHR is very similar to DOPEHR but is obtained at
+                                       # Higher Resolution (using a bin size of 0.125Å
+                                       # rather than 0.5Å).
+                                       assess_methods=assess.DOPEHR)
+                a_model.very_fast()
+                # index of the first and last model (determines how many models to calculate)
+                a_model.starting_model = 1
+                a_model.ending_model = 1
+                modeller_dope_score = 0
+                # Catch any errors that Modeller can raise and write them in the log file
+                try:
+                    a_model.make()
+                except m.ModellerError as err:
+                    logging.warning("Modeller error with " + self.template.name + " | "
+                                    + self.template.pdb, str(err))
+            new_model_pdb = a_model.outputs[0]["name"]
+            modeller_dope_score = a_model.outputs[0]["DOPE-HR score"]
+            self.template.modeller_pdb = self.template.pdb + "_mod"
+            # Move the new model to the PDB directory and rename it, replacing the model of
+            # a previous run
+            os.replace(new_model_pdb, path_to_atm + "/" + self.template.modeller_pdb + ".atm")
+            # Parse the new model generated by MODELLER to get the residues and their coordinates
+            self.template.parse_pdb(path_to_atm + "/" + self.template.modeller_pdb + ".atm")
+        finally:
+            # Go back to root directory
+            os.chdir(root_dir)
         return modeller_dope_score * (-1)
 
     def calculate_blosum_score(self):
@@ -456,21 +507,11 @@ class Alignment:
             Returns:
                 int: The blosum score calculated.
         """
-        # dictionary containing substitution scores of the blosum62 matrix
-        blosum62 = MatrixInfo.blosum62
-        score = 0
-        for ind, res_q in enumerate(self.query.residues):
-            res_t = self.template.residues[ind]
-            if res_q.name == "-" or res_t.name == "-":
-                continue
-            # The blosum62 matrix is symetric, thus we need to test
-            # if (res_1, res_2) key is in the dictionary.
-            if (res_q.name, res_t.name) in blosum62:
-                score += blosum62[(res_q.name, res_t.name)]
-            # If not, the corresponding key is (res_2, res_1)
-            else:
-                score += blosum62[(res_t.name, res_q.name)]
-        return score
+        query_codes = encode_residues(self.query.residues, BLOSUM_ALPHABET)
+        template_codes = encode_residues(self.template.residues, BLOSUM_ALPHABET)
+        # Gaps are encoded as -1 and skipped
+        aligned = (query_codes != -1) & (template_codes != -1)
+        return int(np.sum(BLOSUM62_TABLE[query_codes[aligned], template_codes[aligned]]))
 
     def write_pdb(self, pdb_path):
         """
@@ -479,45 +520,32 @@ class Alignment:
             Args:
                 pdb_path (str): Path of the pdb file to create.
         """
-        with open(pdb_path, "w") as file:
-            # Extra informations on the template used to generate the pdb file
-            file.write("REMARK Threading of query sequence on the {:s} template #{:d}.\n"
-                       .format(self.template.name, self.num))
-            ind = 0
-            count_atom = 1
-            for count_res in range(self.query.first, self.query.last+1):
-                res_t = self.template.residues[ind]
-                res_q = self.query.residues[ind]
-                if res_q.name == "-" or res_t.name == "-":
-                    ind += 1
-                    continue
-                # # N "ATOM" line
-                file.write("{:6s}{:5d} {:^4s} {:>3s}{:>2s}{:4d}{:>12.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}{:>12s}\n"
-                           .format("ATOM", count_atom, "N", seq3(res_q.name).upper(), "A",
-                                   count_res,
-                                   res_t.n_atom.coords[0],
-                                   res_t.n_atom.coords[1],
-                                   res_t.n_atom.coords[2],
-                                   1.00, 0, "N"))
-                count_atom += 1
-                # CA "ATOM" line
-                file.write("{:6s}{:5d} {:^4s} {:>3s}{:>2s}{:4d}{:>12.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}{:>12s}\n"
-                           .format("ATOM", count_atom, "CA", seq3(res_q.name).upper(), "A",
-                                   count_res,
-                                   res_t.ca_atom.coords[0],
-                                   res_t.ca_atom.coords[1],
-                                   res_t.ca_atom.coords[2],
-                                   1.00, 0, "C"))
-                count_atom += 1
-                # C "ATOM" line
-                file.write("{:6s}{:5d} {:^4s} {:>3s}{:>2s}{:4d}{:>12.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}{:>12s}\n"
-                           .format("ATOM", count_atom, "C", seq3(res_q.name).upper(), "A",
-                                   count_res,
-                                   res_t.c_atom.coords[0],
-                                   res_t.c_atom.coords[1],
-                                   res_t.c_atom.coords[2],
-                                   1.00, 0, "C"))
-                count_atom += 1
+        # Extra informations on the template used to generate the pdb file
+        lines = ["REMARK Threading of query sequence on the {:s} template #{:d}.\n"
+                 .format(self.template.name, self.num)]
+        # The lines are gathered and written in one go instead of one write per atom
+        atom_line = "{:6s}{:5d} {:^4s} {:>3s}{:>2s}{:4d}{:>12.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}{:>12s}\n"
+        # N, CA and C atoms of each residue: name, coordinates and element
+        atoms = [("N", self.template.n_coords, "N"),
+                 ("CA", self.template.ca_coords, "C"),
+                 ("C", self.template.c_coords, "C")]
+        ind = 0
+        count_atom = 1
+        for count_res in range(self.query.first, self.query.last+1):
+            res_t = self.template.residues[ind]
+            res_q = self.query.residues[ind]
+            if res_q.name == "-" or res_t.name == "-":
                 ind += 1
-            # The two last lines of the created pdb file ("END" and "TER" lines)
-            file.write("END\n")
+                continue
+            res_name = seq3(res_q.name).upper()
+            for atom_name, coords, element in atoms:
+                x_coord, y_coord, z_coord = coords[ind]
+                lines.append(atom_line.format("ATOM", count_atom, atom_name, res_name, "A",
+                                              count_res, x_coord, y_coord, z_coord,
+                                              1.00, 0, element))
+                count_atom += 1
+            ind += 1
+        # The last line of the created pdb file
+        lines.append("END\n")
+        with open(pdb_path, "w") as file:
+            file.write("".join(lines))
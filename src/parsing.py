@@ -11,7 +11,7 @@ import numpy as np
 from Bio.SeqUtils import seq1
 
 # Local modules
-from src.residue import Residue
+from src.residue import Residue, AMINO_ACIDS
 from src.alignment import Alignment
 from src.query import Query
 from src.template import Template
@@ -168,26 +168,29 @@ def parse_benchmark(query_name, benchmark_file, alignment_dict):
 
 def parse_dope(dope_file):
     """
-        Extracts 30 dope energy values for the 20*20 residus-CA pairs and stores it
-        in a dictionary with key = res_1-res_2 and value = an array of the 30 dope scores.
+        Extracts 30 dope energy values for the 20*20 residus-CA pairs and stores them in
+        a numpy array indexed by the codes of the two residues (their position in
+        AMINO_ACIDS) and the distance interval. The threading score reads the energies
+        from this table directly, without building a dictionary key for each pair.
 
         Args:
             dope_file (str): The file dope.par containing energy values for each
                        amino acid pair.
 
         Returns:
-            dict: A dictionary with key = res_1-res_2 and value = an array of
-            the 30 dope energy values.
+            Numpy array: A (20, 20, 30) array of the dope energy values.
     """
-    dope_dict = {}
+    # DOPE energy values spread between 0.25 and 15 by 0.5 intervals: 30 intervals
+    dope_table = np.zeros((len(AMINO_ACIDS), len(AMINO_ACIDS), 30))
     with open(dope_file, "r") as file:
         for line in file:
             # get the line with C-alpha for both amino acids
             if line[4:6] == "CA" and line[11:13] == "CA":
-                res_1 = seq1(line[0:3])
-                res_2 = seq1(line[7:10])
-                dope_dict[res_1+res_2] = np.fromstring(line[14:-1], dtype=float, sep=" ")
-    return dope_dict
+                res_1 = AMINO_ACIDS.find(seq1(line[0:3]))
+                res_2 = AMINO_ACIDS.find(seq1(line[7:10]))
+                if res_1 != -1 and res_2 != -1:
+                    dope_table[res_1, res_2] = np.fromstring(line[14:-1], dtype=float, sep=" ")
+    return dope_table
 
 
 def get_index_list(aln_file_clustal):
@@ -227,6 +230,9 @@ def parse_ccmpred_result(ccmpred_result, index_list):
     top_couplings = subprocess.check_output(
         ["./bin/CCMpred/scripts/top_couplings.py -n {} {}".
          format(str(ntops), ccmpred_result)], shell=True).decode('utf-8').split('\n')[1:-1]
+    # Position of each index in index_list, built once instead of scanning the list
+    # for every coupling
+    index_positions = {index: pos for pos, index in enumerate(index_list)}
     # Create a dictionary of top couplings
     top_couplings_dict = {}
     for k, value in enumerate(top_couplings):
@@ -234,6 +240,6 @@ def parse_ccmpred_result(ccmpred_result, index_list):
         index_i = int(values[0])
         index_j = int(values[1])
         # Do not parse gaps associated with top couplings
-        if (index_i in index_list) and (index_j in index_list):
-            top_couplings_dict[k] = (index_list.index(index_i), index_list.index(index_j))
+        if (index_i in index_positions) and (index_j in index_positions):
+            top_couplings_dict[k] = (index_positions[index_i], index_positions[index_j])
     return top_couplings_dict
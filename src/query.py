@@ -3,6 +3,10 @@
    :synopsis: This module implements the Query class.
 """
 
+# Third-party modules
+import numpy as np
+
+# Local modules
 from src.residue import Residue
 
 class Query:
@@ -16,15 +20,22 @@ class Query:
                                             objects
         first (int): First residue of the query sequence.
         last (int): Last residue of the query sequence.
+        gapless_indexes (Numpy array): Indexes in the alignment of the residues which are
+                                       not gaps.
+        gapless_len (int): Number of residues which are not gaps.
     """
 
     def __init__(self, residues, first, last):
         self.residues = residues
         # This is a "temporary" list of residues for Modeller, which we will modify only
-        # in order to make the PIR alignment (by inserting gaps).
-        self.modeller_residues = residues
+        # in order to make the PIR alignment (by inserting gaps). It is a copy, so that
+        # these gaps do not change the residues (and their gapless indexes) of the query.
+        self.modeller_residues = list(residues)
         self.first = first
         self.last = last
+        # The gaps are located once for all the scores
+        self.gapless_indexes = np.flatnonzero([res.name != "-" for res in residues])
+        self.gapless_len = len(self.gapless_indexes)
 
     def display(self, modeller=False):
         """
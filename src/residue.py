@@ -6,8 +6,24 @@
 # Third-party modules
 import numpy as np
 
-# Local modules
-from src.atom import Atom
+# One letter codes of the 20 standard amino acids. The position of an amino acid in this
+# string is used as its integer code to index numpy tables (DOPE energies for example).
+AMINO_ACIDS = "ARNDCQEGHILKMFPSTWYV"
+
+
+def encode_residues(residues, alphabet=AMINO_ACIDS):
+    """
+        Encodes residues as integer codes: their position in the alphabet.
+        Gaps and residues which are not in the alphabet are encoded as -1.
+
+        Args:
+            residues (list of Residue objects): The residues to encode.
+            alphabet (str): One letter codes of the residues, AMINO_ACIDS by default.
+
+        Returns:
+            Numpy array: The codes of the residues.
+    """
+    return np.array([alphabet.find(res.name) for res in residues], dtype=np.int8)
 
 
 class Residue:
@@ -18,15 +34,12 @@ class Residue:
 
     Attributes:
         name (str): Name of the residue (1 letter code)
-        ca_coords (Numpy array): 3D coordinates of the residue
+        secondary_struct (str): Predicted secondary structure of the residue
+        ss_confidence (int): Confidence of the secondary structure prediction
     """
 
     def __init__(self, name):
         self.name = name
-        self.ca_atom = Atom("CA")
-        self.cb_atom = Atom("CB")
-        self.c_atom = Atom("C")
-        self.n_atom = Atom("N")
         self.secondary_struct = None
         self.ss_confidence = None
 
@@ -35,28 +48,3 @@ class Residue:
 
     def __repr__(self):
         return str(self.name)
-
-    def calculate_distance(self, residue, carbon):
-        """
-            Calculate Euclidian distance between two residues with THE most efficient method, the
-            Einstein summation convention with *numpy.einsum*.
-
-            .. math::
-
-               distance = \sqrt{(x_a-x_b)^2+(y_a-y_b)^2+(z_a-z_b)^2}
-
-            Args:
-                residue (object): An object of the Residue class.
-                carbon (str): Type of the carbon.
-
-            Returns:
-                float: The calculated distance.
-        """
-        if carbon == "CA":
-            a_min_b = self.ca_atom.coords - residue.ca_atom.coords
-        elif carbon == "CB":
-            a_min_b = self.cb_atom.coords - residue.cb_atom.coords
-        # The Numpy's "einsum" function is the most efficient way to calculate a distance
-        #  accordingly to this benchmarking: https://stackoverflow.com/a/47775357/6401758
-        dist = np.sqrt(np.einsum('i,i->', a_min_b, a_min_b))
-        return dist
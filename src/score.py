@@ -5,9 +5,20 @@
 
 # Third-party modules
 import os
+import logging
+import numpy as np
 import pandas as pd
 
 
+# Scores combined into the sum_scores and the weighted_combined_scores
+SCORE_TYPES = ['alignment', 'threading', 'modeller', 'secondary_structure', 'solvent_access',
+               'co_evolution']
+# Intercept and weights (in the SCORE_TYPES order) of the logistic regression done with
+# scripts/machine_learning.R
+ML_INTERCEPT = -10.8256
+ML_WEIGHTS = np.array([4.5026, -0.0764, 1.0713, 3.8989, -2.7788, -1.2846])
+
+
 def normalize_score(score_type):
     """
         Normalization of a score using the min-max scaling method (values between 0 and 1):
@@ -36,12 +47,17 @@ def normalize_score(score_type):
         Returns:
             Pandas Series: The score normalized
     """
-    try:
-        normalized = (score_type - min(score_type)) / (max(score_type) - min(score_type))
-    except ZeroDivisionError:
-        print("\nError: normalize_score: Division by 0\n")
-        normalized = 0
-    return normalized
+    # The minimum is computed only once, with the vectorized pandas reductions
+    # instead of the builtin min/max which iterate over the values in Python
+    min_score = score_type.min()
+    max_score = score_type.max()
+    # A constant score (a single template for example) can not be scaled: the division by 0
+    # would give NaN for all the templates, which would then spread to the combined scores.
+    # The score is set to 0 instead, so it does not weigh in the ranking.
+    if max_score == min_score:
+        logging.warning("normalize_score: constant score %s, normalized to 0", score_type.name)
+        return pd.Series(0, index=score_type.index)
+    return (score_type - min_score) / (max_score - min_score)
     # Use sklearn module instead
     # https://web.archive.org/web/20160520170701/http://chrisalbon.com:80/python/pandas_normalize_column.html
 
@@ -71,25 +87,29 @@ class Score:
         """
         os.makedirs(res_path+"/pdb", exist_ok=True)
 
-        # A dataframe is created with pandas and elements of the iterator are stored
-        scores_df = pd.DataFrame(columns=['benchmark', 'alignment', 'threading', 'modeller',
-                                          'secondary_structure', 'solvent_access', 'co_evolution'])
+        # Elements of the iterator are gathered first and the pandas dataframe is then
+        # created in one go: enlarging it row by row with .loc copies the whole dataframe
+        # for each new template.
+        names = []
+        rows = []
         for _, ali_score, thr_score, modeller_score, ss_score,\
                 solvent_access_score, ccmpred_score, name, benchmark in sorted(self.iterator):
-            scores_df.loc[name] = [benchmark, ali_score, thr_score, modeller_score,
-                                   ss_score, solvent_access_score, ccmpred_score]
+            names.append(name)
+            rows.append([benchmark, ali_score, thr_score, modeller_score,
+                         ss_score, solvent_access_score, ccmpred_score])
+        scores_df = pd.DataFrame(rows, index=names,
+                                 columns=['benchmark', 'alignment', 'threading', 'modeller',
+                                          'secondary_structure', 'solvent_access', 'co_evolution'])
 
         # Normalization of the scores.
         # Not the ss_score neither solvent access_score because they are already between 0-1
         for index in ['alignment', 'threading', 'modeller', 'co_evolution']:
             scores_df[index] = normalize_score(scores_df[index])
+        # The different scores are combined as a single block of values instead of
+        # adding the columns one by one
+        scores_block = scores_df[SCORE_TYPES]
         # Sum of the different scores and normalization
-        scores_df['sum_scores'] = normalize_score(scores_df['alignment']
-                                                  + scores_df['threading']
-                                                  + scores_df['modeller']
-                                                  + scores_df['secondary_structure']
-                                                  + scores_df['solvent_access']
-                                                  + scores_df['co_evolution'])
+        scores_df['sum_scores'] = normalize_score(scores_block.sum(axis=1))
 
         # The machine learning was done using logistic regression with the R script located in
         # scripts/machine_learning.R
@@ -97,17 +117,11 @@ class Score:
         # the benchmarking, that is to say it will give higher weights to scores which allow to
         # discriminate best the benchmarking proteins (of class Fold, Family and SuperFamily)
         # The Machine Learning script was run after the benchmarking results were generated.
-        # The optimized weights are directly reported here to build a new column in CSV
-        # scores.csv file for a weighted_combined_score.
+        # The optimized weights are reported in ML_INTERCEPT and ML_WEIGHTS to build a new
+        # column in CSV scores.csv file for a weighted_combined_score.
         # The templates are then ranked according to this weighted_combined_scores.
         scores_df['weighted_combined_scores'] = normalize_score(
-                                                    -10.8256
-                                                  + 4.5026 * scores_df['alignment']
-                                                  + -0.0764 * scores_df['threading']
-                                                  + 1.0713 * scores_df['modeller']
-                                                  + 3.8989 * scores_df['secondary_structure']
-                                                  + -2.7788 * scores_df['solvent_access']
-                                                  + -1.2846 * scores_df['co_evolution'])
+            ML_INTERCEPT + scores_block.dot(ML_WEIGHTS))
 
         # Sort of the templates according to the weighted_combined_scores
         scores_df = scores_df.sort_values(by="weighted_combined_scores", ascending=False)
@@ -115,19 +129,14 @@ class Score:
         scores_df.to_csv(res_path+"/scores.csv")
 
         # Write the required ranking output with columns: Rank | Family | Score
-        ranked_scores_df = pd.read_csv(res_path+"/scores.csv")
-        ranks = pd.Series(list(range(1, len(ranked_scores_df)+1)))
-        tmp = pd.concat([ranks, ranked_scores_df], axis=1)
-        tmp.columns = ['Rank', 'Template', 'benchmark', 'alignment', 'threading', 'modeller',
-                       'secondary_structure', 'solvent_access', 'co_evolution', 'sum_scores',
-                       'weighted_combined_scores']
-        ranked_scores_df = pd.concat([tmp["Rank"], tmp["Template"], tmp['weighted_combined_scores']], axis=1)
+        # The sorted dataframe is reused directly, no need to parse back the csv file.
+        # The three columns are read as numpy arrays, no intermediate dataframe is built.
+        ranks = np.arange(1, len(scores_df)+1)
         with open(res_path+ "/ranking.txt", "w") as f_out:
             f_out.write("{}{:>22}{:>30}\n{}\n".format("Rank", "Template", "Weighted Combined Scores", "*"*56))
-            for index, row in ranked_scores_df.iterrows():
-                f_out.write("{:<3}{:>23}{:>12.4f}\n".format(str(row["Rank"]),
-                                                            str(row["Template"]),
-                                                            row["weighted_combined_scores"]))
+            for rank, template, score in zip(ranks, scores_df.index.values,
+                                             scores_df["weighted_combined_scores"].values):
+                f_out.write("{:<3}{:>23}{:>12.4f}\n".format(str(rank), str(template), score))
 
         # Only nb_pdb pdb files are created
         for i in range(nb_pdb):
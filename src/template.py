@@ -3,7 +3,7 @@
    :synopsis: This module implements the Template class.
 """
 
-# Third-party modulesimport logging
+# Third-party modules
 import logging
 import numpy as np
 
@@ -26,6 +26,12 @@ class Template:
                          It tells how similar the template is from the query structure.
                          This is necessary to be able to benchmark the new scoring functions.
         pdb (str): PDB filename of the template
+        n_coords, ca_coords, cb_coords, c_coords (Numpy arrays): (N, 3) float32 coordinates of
+                                                                 the atoms of all the residues,
+                                                                 NaN for gaps and missing atoms.
+        gapless_indexes (Numpy array): Indexes in the alignment of the residues which are
+                                       not gaps.
+        gapless_len (int): Number of residues which are not gaps.
     """
 
     def __init__(self, name, residues):
@@ -36,6 +42,16 @@ class Template:
         self.reindexed_pdb = None   # ex: 1jlxa1_reindexed
         self.modeller_pdb = None    # ex: 1jlxa1_mod
         self.first = None
+        # Coordinates of the atoms, filled in place by parse_pdb. Single precision is
+        # plenty for coordinates given with 3 decimals and halves the memory traffic of
+        # the distance calculations
+        self.n_coords = np.full((len(residues), 3), np.nan, dtype=np.float32)
+        self.ca_coords = np.full((len(residues), 3), np.nan, dtype=np.float32)
+        self.cb_coords = np.full((len(residues), 3), np.nan, dtype=np.float32)
+        self.c_coords = np.full((len(residues), 3), np.nan, dtype=np.float32)
+        # The gaps are located once for all the scores
+        self.gapless_indexes = np.flatnonzero([res.name != "-" for res in residues])
+        self.gapless_len = len(self.gapless_indexes)
 
     def display(self):
         """
@@ -95,21 +111,19 @@ class Template:
                             count_res += 1
                         if count_res == len(self.residues):
                             break
+                        coords = (x_coord, y_coord, z_coord)
+                        # The coordinates are only stored in the arrays of the template
                         if line_type == "ATOM" and name_at == "N":
-                            self.residues[count_res].n_atom\
-                                .set_coords(np.array([x_coord, y_coord, z_coord]))
+                            self.n_coords[count_res] = coords
                             nb_atoms += 1
                         elif line_type == "ATOM" and name_at == "CA":
-                            self.residues[count_res].ca_atom\
-                                .set_coords(np.array([x_coord, y_coord, z_coord]))
+                            self.ca_coords[count_res] = coords
                             nb_atoms += 1
                         elif line_type == "ATOM" and name_at == "CB":
-                            self.residues[count_res].cb_atom\
-                                .set_coords(np.array([x_coord, y_coord, z_coord]))
+                            self.cb_coords[count_res] = coords
                             nb_atoms += 1
                         elif line_type == "ATOM" and name_at == "C":
-                            self.residues[count_res].c_atom\
-                                .set_coords(np.array([x_coord, y_coord, z_coord]))
+                            self.c_coords[count_res] = coords
                             nb_atoms += 1
                         if nb_atoms == 3:
                             count_res += 1